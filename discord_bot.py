@@ -2,14 +2,20 @@ import discord
 from discord.ext import commands, tasks
 import asyncio
 import re
-from datetime import datetime
-from PIL import Image
-import pytesseract
-from notion_client import Client
+from datetime import datetime, timezone
+from PIL import Image, ImageOps
 import os
+# Parallelism comes from the OCR workers; stop each Tesseract instance from starting its own
+# OpenMP thread pool on top of that. Must be set before tesserocr is imported.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+from tesserocr import PyTessBaseAPI, PSM
+from notion_client import AsyncClient
 import io
 import logging
 import csv
+import hashlib
+from cachetools import LRUCache, TTLCache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv # <--- Import for .env file
 
 # Load environment variables from .env file
@@ -35,15 +41,78 @@ except Exception as e:
 # --- END CONFIGURATION ---
 
 # Bot setup: Intents
-intents = discord.Intents.default()
+# Only subscribe to what the bot uses (guild/thread info and guild messages), so the
+# gateway doesn't send typing, presence, reaction, DM... events we would just ignore.
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
 # Initialize Notion
-notion = Client(auth=NOTION_TOKEN)
+notion = AsyncClient(auth=NOTION_TOKEN)
 
-# Dictionary to track analytic type and photos per thread ID
-thread_state = {}  # e.g., {thread_id: {'type': 'TikTok', 'photos': []}}
+# Completed tickets are queued and processed by background workers, so on_message
+# returns right away instead of waiting on downloads, OCR and Notion
+TICKET_WORKERS = 4
+ticket_queue = None  # Created in start_ticket_workers() from setup_hook
+ticket_worker_tasks = []
+
+# Notion writes go through a queue; a background writer sends whatever piled up concurrently
+NOTION_BATCH_SIZE = 10
+notion_queue = None  # Created in start_notion_writer() from setup_hook
+notion_writer_task = None
+
+# OCR scheduler: jobs go on a queue and a fixed set of long-lived workers pick them up.
+# Each worker owns one OCR thread and one in-process Tesseract instance (model stays loaded),
+# so Tesseract never blocks the event loop. tesserocr releases the GIL while recognizing.
+# Kept small: every worker holds its own copy of the LSTM model in memory.
+OCR_WORKERS = 2
+ocr_queue = None  # Created in start_ocr_workers() from setup_hook
+ocr_worker_tasks = []
+
+# Image pre-processing before OCR
+OCR_MAX_DIMENSION = 1024
+
+# OCR results keyed by image content hash, so re-uploaded screenshots skip Tesseract
+ocr_cache = LRUCache(maxsize=512)
+
+# --- TICKET TYPE DETECTION ---
+# One case-insensitive pass over the message instead of a lowercase copy plus a scan per keyword
+PLATFORM_RE = re.compile(r'tiktok|insta(?:gram)?|youtube', re.IGNORECASE | re.ASCII)
+PLATFORM_REPLIES = {
+    'tiktok': ('TikTok', "Ready for TikTok analytics photo."),
+    'insta': ('Instagram', "Ready for two Instagram analytics photos."),
+    'instagram': ('Instagram', "Ready for two Instagram analytics photos."),
+    'youtube': ('YouTube', "Ready for YouTube CSV file."),
+}
+
+# --- OCR PARSING PATTERNS ---
+# TikTok: a line starting with one or two metric values (e.g. '12.3K' or '1,024 56')
+METRIC_LINE_RE = re.compile(r'([\d\.,]+[KM]?)(?:\s+([\d\.,]+[KM]?))?', re.IGNORECASE)
+NUMBER_SUFFIXES = {'K': 1000, 'M': 1000000}
+
+# Instagram
+IG_VIEWS_RE1 = re.compile(r'Views\s*\n*\s*(\d{3,})', re.IGNORECASE)
+IG_VIEWS_RE2 = re.compile(r'(\d{3,})\s*Views', re.IGNORECASE)
+LIKES_RE = re.compile(r'Likes\s*(\d+)', re.IGNORECASE)
+COMMENTS_RE = re.compile(r'Comments\s*(\d+)', re.IGNORECASE)
+IG_SHARES_RE = re.compile(r'Shares\s*(\d+)', re.IGNORECASE)
+IG_VIEWS_ABOVE_RE = re.compile(r'(\d{4,})\s*\n\s*Views', re.IGNORECASE)
+IG_VIEWS_INLINE_RE = re.compile(r'(\d{1,3}(?:,\d{3})*)\s*Views', re.IGNORECASE)
+IG_LARGE_NUMBER_RE = re.compile(r'^\s*(\d{3,5})\s*$', re.MULTILINE)
+STRIP_COMMAS = str.maketrans('', '', ',')
+
+# Tracks analytic type and photos per thread ID.
+# Abandoned tickets expire an hour after their last message instead of staying in memory forever.
+thread_state = TTLCache(maxsize=1024, ttl=3600)  # e.g., {thread_id: {'type': 'TikTok', 'photos': []}}
+
+@bot.event
+async def setup_hook():
+    # Runs once, before the bot connects to the gateway, so the queues exist before any message arrives
+    start_ocr_workers()
+    start_notion_writer()
+    start_ticket_workers()
 
 @bot.event
 async def on_ready():
@@ -56,26 +125,23 @@ async def on_message(message):
     if message.author == bot.user:
         return
     
-    # Only process in threads under TICKETS_CHANNEL_ID
-    if isinstance(message.channel, discord.Thread) and message.channel.parent and message.channel.parent.id == TICKETS_CHANNEL_ID:
-        thread_id = message.channel.id
-        if thread_id not in thread_state:
-            thread_state[thread_id] = {'type': None, 'photos': []}
-        
-        state = thread_state[thread_id]
+    # Only process in threads under TICKETS_CHANNEL_ID.
+    # parent_id is a plain attribute, unlike .parent which goes through the channel cache.
+    channel = message.channel
+    if message.guild is not None and channel.__class__ is discord.Thread and channel.parent_id == TICKETS_CHANNEL_ID:
+        thread_id = channel.id
+        state = thread_state.get(thread_id)
+        if state is None:
+            state = {'type': None, 'photos': []}
+        # Re-insert on every message so the TTL counts from the last activity, not ticket creation
+        thread_state[thread_id] = state
         
         # Check for type message (text)
         if message.content and not message.attachments:
-            content_lower = message.content.lower()
-            if 'tiktok' in content_lower:
-                state['type'] = 'TikTok'
-                await message.reply("Ready for TikTok analytics photo.")
-            elif 'instagram' in content_lower or 'insta' in content_lower:
-                state['type'] = 'Instagram'
-                await message.reply("Ready for two Instagram analytics photos.")
-            elif 'youtube' in content_lower:
-                state['type'] = 'YouTube'
-                await message.reply("Ready for YouTube CSV file.")
+            platform_match = PLATFORM_RE.search(message.content)
+            if platform_match:
+                state['type'], reply = PLATFORM_REPLIES[platform_match.group(0).lower()]
+                await message.reply(reply)
             return  # Stop processing if a type message was handled
         
         # Handle attachments based on type
@@ -84,8 +150,8 @@ async def on_message(message):
                 # Expect CSV attachment
                 attachment = message.attachments[0]
                 if attachment.filename.lower().endswith('.csv'):
-                    await process_youtube_csv(message, attachment)
-                    del thread_state[thread_id] # Clean up state after processing
+                    await queue_ticket(message, 'YouTube', [attachment])
+                    thread_state.pop(thread_id, None) # Clean up state after queueing
                 else:
                     await message.reply("Please send a CSV file for YouTube.")
             else:
@@ -93,70 +159,229 @@ async def on_message(message):
                 state['photos'].append(message.attachments[0])
                 
                 if state['type'] == 'TikTok' and len(state['photos']) == 1:
-                    await process_tiktok_photo(message, state['photos'][0])
-                    del thread_state[thread_id]  # Reset/Clean up
+                    await queue_ticket(message, 'TikTok', state['photos'])
+                    thread_state.pop(thread_id, None)  # Reset/Clean up
                 elif state['type'] == 'Instagram' and len(state['photos']) == 2:
-                    await process_instagram_photos(message, state['photos'])
-                    del thread_state[thread_id]  # Reset/Clean up
+                    await queue_ticket(message, 'Instagram', state['photos'])
+                    thread_state.pop(thread_id, None)  # Reset/Clean up
                 elif state['type'] == 'Instagram' and len(state['photos']) < 2:
                     await message.reply(f"Received photo 1/2. Send the second photo.")
     
     await bot.process_commands(message)
 
+# --- TICKET QUEUE ---
+
+def start_ticket_workers():
+    global ticket_queue
+    ticket_queue = asyncio.Queue()
+    for _ in range(TICKET_WORKERS):
+        ticket_worker_tasks.append(asyncio.create_task(ticket_worker()))
+
+async def queue_ticket(message, analytic_type, attachments):
+    # Reply first so the result message can't arrive before the "queued" one
+    await message.reply(f"⏳ {analytic_type} analytics queued for processing...")
+    await ticket_queue.put((message, analytic_type, attachments))
+
+async def ticket_worker():
+    while True:
+        message, analytic_type, attachments = await ticket_queue.get()
+        try:
+            if analytic_type == 'TikTok':
+                await process_tiktok_photo(message, attachments[0])
+            elif analytic_type == 'Instagram':
+                await process_instagram_photos(message, attachments)
+            elif analytic_type == 'YouTube':
+                await process_youtube_csv(message, attachments[0])
+        except Exception as e:
+            logger.error(f"Ticket processing error ({analytic_type}): {e}")
+            try:
+                await message.reply(f"❌ Failed to process {analytic_type} analytics. Check logs.")
+            except Exception as reply_error:
+                logger.error(f"Could not report ticket error: {reply_error}")
+        finally:
+            ticket_queue.task_done()
+
 # --- OCR PROCESSING FUNCTIONS ---
 
-async def process_tiktok_photo(message, attachment):
-    image_bytes = await attachment.read()
+def otsu_threshold(histogram):
+    # Threshold that best separates the histogram into two classes (max between-class variance)
+    total = sum(histogram)
+    total_sum = sum(p * count for p, count in enumerate(histogram))
+    background_count = 0
+    background_sum = 0
+    best_threshold = 0
+    best_variance = 0
+    for p, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += p * count
+        background_mean = background_sum / background_count
+        foreground_mean = (total_sum - background_sum) / foreground_count
+        variance = background_count * foreground_count * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = p
+    return best_threshold
+
+def create_tess_api():
+    # PSM 6: single block of text (often better for key metrics layout)
+    return PyTessBaseAPI(psm=PSM.SINGLE_BLOCK)
+
+def ocr_image_bytes(api, image_bytes):
     image = Image.open(io.BytesIO(image_bytes))
     
-    # Pre-processing: Convert to grayscale
-    image = image.convert('L') 
+    # Pre-processing: Convert to grayscale.
+    # draft() lets the JPEG decoder produce grayscale directly and, for big photos, decode
+    # at a reduced scale (no-op for PNG etc.)
+    image.draft('L', (OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+    if image.mode != 'L':
+        image = image.convert('L')
     
-    # Use PSM 6 for single block of text (often better for key metrics layout)
-    text = pytesseract.image_to_string(image, config='--psm 6') 
-    logger.info(f"TikTok OCR text:\n{text}")
+    # Oversized phone screenshots only slow Tesseract down; metric text survives downscaling
+    if max(image.size) > OCR_MAX_DIMENSION:
+        image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION), Image.BILINEAR)
     
-    def parse_number(s):
-        s = s.strip().replace(',', '')
-        
-        # Remove any periods that aren't followed by a digit or K/M (i.e., remove stray periods)
-        s = re.sub(r'(?!\.\d|.[KM])\.', '', s) 
-        
-        multiplier = 1
-        
-        # 1. Check for multiplier and strip it
-        if s.endswith('K'):
-            s = s[:-1]
-            multiplier = 1000
-        elif s.endswith('M'):
-            s = s[:-1]
-            multiplier = 1000000
-        
-        # 2. Trust the number part (s).
+    # Dark-theme screenshots: invert so text is dark on a light background
+    histogram = image.histogram()
+    if sum(p * count for p, count in enumerate(histogram)) < 128 * sum(histogram):
+        image = ImageOps.invert(image)
+        histogram = histogram[::-1]
+    
+    # Binarize: Tesseract is faster and more accurate on clean black/white text.
+    # Otsu picks the threshold per image, so mid-gray labels aren't lost with the background.
+    threshold = otsu_threshold(histogram)
+    image = image.point([255 if p > threshold else 0 for p in range(256)])
+    
+    api.SetImage(image)
+    return api.GetUTF8Text()
+
+def start_ocr_workers():
+    global ocr_queue
+    ocr_queue = asyncio.Queue()
+    for i in range(OCR_WORKERS):
+        ocr_worker_tasks.append(asyncio.create_task(ocr_worker(i)))
+
+async def ocr_worker(worker_id):
+    # Decoding and Tesseract are blocking, so each worker runs them on its own thread.
+    # PyTessBaseAPI isn't thread-safe, so every worker loads its own and only ever uses it there.
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'ocr-{worker_id}')
+    try:
+        api = await loop.run_in_executor(executor, create_tess_api)
+    except Exception as e:
+        logger.error(f"OCR worker {worker_id} failed to load Tesseract, retrying on first job: {e}")
+        api = None
+    while True:
+        image_bytes, future = await ocr_queue.get()
         try:
-            val = float(s)
-            return int(val * multiplier)
-        except ValueError:
+            if api is None:
+                api = await loop.run_in_executor(executor, create_tess_api)
+            text = await loop.run_in_executor(executor, ocr_image_bytes, api, image_bytes)
+            if not future.done():
+                future.set_result(text)
+        except Exception as e:
+            logger.error(f"OCR worker {worker_id} error: {e}")
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            ocr_queue.task_done()
+
+async def run_ocr(image_bytes):
+    digest = hashlib.blake2b(image_bytes, digest_size=16).digest()
+    if digest in ocr_cache:
+        logger.info("OCR cache hit, skipping Tesseract")
+        return ocr_cache[digest]
+    
+    # Queue the job for the next free OCR worker and wait for its result
+    future = asyncio.get_running_loop().create_future()
+    await ocr_queue.put((image_bytes, future))
+    text = await future
+    ocr_cache[digest] = text
+    return text
+
+def parse_tiktok_number(s):
+    # Hand-rolled scan instead of float(): OCR garbage is common, and returning 0 directly
+    # is much cheaper than raising and catching ValueError
+    s = s.strip().translate(STRIP_COMMAS).rstrip('.')
+    
+    # 1. Check for multiplier and strip it
+    multiplier = NUMBER_SUFFIXES.get(s[-1:].upper(), 1)
+    if multiplier != 1:
+        s = s[:-1]
+    
+    # 2. Accumulate the integer and decimal digits; stray periods are skipped
+    whole = 0
+    fraction = 0
+    fraction_scale = 1
+    in_fraction = False
+    for i, c in enumerate(s):
+        if '0' <= c <= '9':
+            if in_fraction:
+                fraction = fraction * 10 + (ord(c) - 48)
+                fraction_scale *= 10
+            else:
+                whole = whole * 10 + (ord(c) - 48)
+        elif c == '.':
+            # Only a period followed by a digit is a decimal point
+            if '0' <= s[i + 1:i + 2] <= '9':
+                if in_fraction:
+                    return 0
+                in_fraction = True
+        else:
             return 0
     
+    return (whole * fraction_scale + fraction) * multiplier // fraction_scale
+
+def parse_instagram_number(s):
+    # Instagram values are plain digit runs (optionally with thousands separators)
+    s = s.strip().translate(STRIP_COMMAS)
+    return int(s) if s.isdecimal() else 0
+
+def find_metric_values(lines, *labels, count=1):
+    # Find the line(s) holding the labels (in order), then read up to `count` values from the
+    # line right below them. If OCR split the values over several lines, keep reading
+    # consecutive numeric lines. A linear scan, so garbled OCR can't make a regex backtrack.
+    i = 0
+    for label in labels:
+        while i < len(lines) and label not in lines[i].lower():
+            i += 1
+        if i == len(lines):
+            return []
+    values = []
+    for line in lines[i + 1:]:
+        match = METRIC_LINE_RE.match(line)
+        if not match:
+            break
+        values.extend(value for value in match.groups() if value)
+        if len(values) >= count:
+            break
+    return values[:count]
+
+async def process_tiktok_photo(message, attachment):
+    image_bytes = await attachment.read()
+    text = await run_ocr(image_bytes)
+    logger.info(f"TikTok OCR text:\n{text}")
+    
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    
     # 1. Post Views: Finds the value under 'Post views' (paired with Profile views)
-    pv_match = re.search(r'Post views.*?Profile views\s*\n\s*([\d\.,]+[KM]?)', text, re.IGNORECASE | re.DOTALL)
-    post_views = parse_number(pv_match.group(1)) if pv_match else 0
+    pv_values = find_metric_values(lines, 'post views', 'profile views')
+    post_views = parse_tiktok_number(pv_values[0]) if pv_values else 0
     
     # 2. Likes and Comments: Finds the values under 'Likes' and 'Comments' (which are usually side-by-side)
-    lc_match = re.search(r'Likes.*?Comments\s*\n\s*([\d\.,]+[KM]?)\s*([\d\.,]+[KM]?)', text, re.IGNORECASE | re.DOTALL)
-
-    if lc_match:
-        # Group 1 is the first number (Likes), Group 2 is the second number (Comments)
-        likes = parse_number(lc_match.group(1))
-        comments = parse_number(lc_match.group(2))
-    else:
-        likes = 0
-        comments = 0
+    lc_values = find_metric_values(lines, 'likes', 'comments', count=2)
+    
+    # First number is Likes, second is Comments
+    likes = parse_tiktok_number(lc_values[0]) if lc_values else 0
+    comments = parse_tiktok_number(lc_values[1]) if len(lc_values) > 1 else 0
     
     # 3. Shares: Finds the value under 'Shares'
-    shares_match = re.search(r'Shares.*?\n\s*([\d\.,]+[KM]?)', text, re.IGNORECASE | re.DOTALL)
-    shares = parse_number(shares_match.group(1)) if shares_match else 0
+    shares_values = find_metric_values(lines, 'shares')
+    shares = parse_tiktok_number(shares_values[0]) if shares_values else 0
     
     await save_to_notion(message, post_views, likes, comments, shares, 'TikTok')
 
@@ -165,23 +390,18 @@ async def process_instagram_photos(message, photos):
         await message.reply("Error: Expected two Instagram photos but received less.")
         return
 
-    # 1. Read and OCR both photos
-    img1_bytes = await photos[0].read()
-    img1 = Image.open(io.BytesIO(img1_bytes)).convert('L')
-    text1 = pytesseract.image_to_string(img1, config='--psm 6')
-    
-    img2_bytes = await photos[1].read()
-    img2 = Image.open(io.BytesIO(img2_bytes)).convert('L')
-    text2 = pytesseract.image_to_string(img2, config='--psm 6')
+    # 1. Read and OCR both photos concurrently
+    img1_bytes, img2_bytes = await asyncio.gather(photos[0].read(), photos[1].read())
+    text1, text2 = await asyncio.gather(run_ocr(img1_bytes), run_ocr(img2_bytes))
 
     # 2. Determine which text is which based on content (sequence-independent)
     text_views = None
     text_interactions = None
     
-    if re.search(r'Views\s*\n*\s*(\d{3,})', text1, re.IGNORECASE | re.DOTALL) or re.search(r'(\d{3,})\s*Views', text1, re.IGNORECASE):
+    if IG_VIEWS_RE1.search(text1) or IG_VIEWS_RE2.search(text1):
         text_views = text1
         text_interactions = text2
-    elif re.search(r'Views\s*\n*\s*(\d{3,})', text2, re.IGNORECASE | re.DOTALL) or re.search(r'(\d{3,})\s*Views', text2, re.IGNORECASE):
+    elif IG_VIEWS_RE1.search(text2) or IG_VIEWS_RE2.search(text2):
         text_views = text2
         text_interactions = text1
     else:
@@ -199,52 +419,52 @@ async def process_instagram_photos(message, photos):
     logger.info(f"Instagram Views OCR (Identified):\n{text_views}")
     logger.info(f"Instagram Interactions OCR (Identified):\n{text_interactions}")
     
-    def parse_number(s):
-        s = s.strip().replace(',', '')
-        try:
-            # Safely remove any trailing non-digit characters that are not a period before conversion
-            s = re.sub(r'[^\d\.]+$', '', s) 
-            return int(float(s))
-        except ValueError:
-            return 0
-    
     # --- Parse Interactions photo (Likes, Comments, Shares) ---
     
-    likes_match = re.search(r'Likes\s*(\d+)', text_interactions, re.IGNORECASE | re.DOTALL)
-    likes = parse_number(likes_match.group(1)) if likes_match else 0
+    likes_match = LIKES_RE.search(text_interactions)
+    likes = parse_instagram_number(likes_match.group(1)) if likes_match else 0
     
-    comments_match = re.search(r'Comments\s*(\d+)', text_interactions, re.IGNORECASE | re.DOTALL)
-    comments = parse_number(comments_match.group(1)) if comments_match else 0
+    comments_match = COMMENTS_RE.search(text_interactions)
+    comments = parse_instagram_number(comments_match.group(1)) if comments_match else 0
     
-    shares_match = re.search(r'Shares\s*(\d+)', text_interactions, re.IGNORECASE | re.DOTALL)
-    shares = parse_number(shares_match.group(1)) if shares_match else 0
+    shares_match = IG_SHARES_RE.search(text_interactions)
+    shares = parse_instagram_number(shares_match.group(1)) if shares_match else 0
 
     # --- Parse Views photo (Views) ---
     
     post_views = 0
     
     # Priority 1: Target the 4-digit number (or more) immediately above 'Views' (e.g., 2115\nViews)
-    views_match_pri1 = re.search(r'(\d{4,})\s*\n\s*Views', text_views, re.IGNORECASE | re.DOTALL)
+    views_match_pri1 = IG_VIEWS_ABOVE_RE.search(text_views)
     
     if views_match_pri1:
-        post_views = parse_number(views_match_pri1.group(1))
+        post_views = parse_instagram_number(views_match_pri1.group(1))
     else:
         # Priority 2: Fallback to the working-but-less-reliable method (number followed by Views on same line)
-        views_match_pri2 = re.search(r'(\d{1,3}(?:,\d{3})*)\s*Views', text_views, re.IGNORECASE) 
+        views_match_pri2 = IG_VIEWS_INLINE_RE.search(text_views)
         if views_match_pri2:
-            post_views = parse_number(views_match_pri2.group(1))
+            post_views = parse_instagram_number(views_match_pri2.group(1))
         else:
             # Fallback 3: Try to find any large number (4+ digits) near the top of the text
-            large_number_match = re.search(r'^\s*(\d{3,5})\s*$', text_views, re.MULTILINE)
-            post_views = parse_number(large_number_match.group(1)) if large_number_match else 0
+            large_number_match = IG_LARGE_NUMBER_RE.search(text_views)
+            post_views = parse_instagram_number(large_number_match.group(1)) if large_number_match else 0
     
     await save_to_notion(message, post_views, likes, comments, shares, 'Instagram')
 
+def csv_int(row, col):
+    # Missing columns (or short rows) count as 0
+    return int(row[col]) if col is not None and col < len(row) else 0
+
 async def process_youtube_csv(message, attachment):
     csv_bytes = await attachment.read()
-    csv_text = io.StringIO(csv_bytes.decode('utf-8'))
+    # Decode lazily while the reader iterates instead of building a second full copy as str.
+    # utf-8-sig also drops the BOM YouTube Studio puts at the start of its exports.
+    csv_text = io.TextIOWrapper(io.BytesIO(csv_bytes), encoding='utf-8-sig', newline='')
     
-    reader = csv.DictReader(csv_text)
+    # Plain csv.reader: rows are lists, looked up by column index instead of a dict per row
+    reader = csv.reader(csv_text)
+    header = next(reader, [])
+    columns = {name: i for i, name in enumerate(header)}
     total_likes = 0
     total_comments = 0
     total_views = 0
@@ -252,26 +472,25 @@ async def process_youtube_csv(message, attachment):
     
     # Headers to check for the total row
     content_headers = ['Video', 'Content Title', 'Content', '']
+    content_col = next((columns[h] for h in content_headers if h in columns), None)
     
-    for row in reader:
-        # Find the key for the content/video column
-        content_key = next((h for h in content_headers if h in row), None)
-        
-        if content_key and (row[content_key] == 'Total' or row[content_key] == 'All videos'):
-            # Use .get() with a safe default of '0' for safety
-            total_likes = int(row.get('Likes', '0'))
-            # Check for 'Comments added' first, then 'Comments'
-            total_comments = int(row.get('Comments added', row.get('Comments', '0')))
-            total_views = int(row.get('Views', '0'))
-            total_shares = int(row.get('Shares', '0')) # Assuming 'Shares' exists
-            break
+    if content_col is not None:
+        for row in reader:
+            if content_col < len(row) and row[content_col] in ('Total', 'All videos'):
+                total_likes = csv_int(row, columns.get('Likes'))
+                # Check for 'Comments added' first, then 'Comments'
+                total_comments = csv_int(row, columns.get('Comments added', columns.get('Comments')))
+                total_views = csv_int(row, columns.get('Views'))
+                total_shares = csv_int(row, columns.get('Shares')) # Assuming 'Shares' exists
+                break
     
     await save_to_notion(message, total_views, total_likes, total_comments, total_shares, 'YouTube')
 
 # --- NOTION & DISCORD BOT FUNCTIONS ---
 
 async def save_to_notion(message, post_views, likes, comments, shares, analytic_type):
-    current_date = datetime.now().isoformat()
+    # Second precision is plenty for Notion's date property
+    current_date = datetime.now(timezone.utc).isoformat(timespec='seconds')
     
     channel_name = message.author.display_name or message.author.name
     
@@ -288,10 +507,7 @@ async def save_to_notion(message, post_views, likes, comments, shares, analytic_
     }
     
     try:
-        notion.pages.create(
-            parent={"database_id": NOTION_DATABASE_ID},
-            properties=properties
-        )
+        await create_notion_page(properties)
         await message.reply(
             f"✅ **{analytic_type}** analytics processed and saved to Notion!\n"
             f"📊 Post Views: **{post_views:,}**\n"
@@ -306,6 +522,37 @@ async def save_to_notion(message, post_views, likes, comments, shares, analytic_
             f"Error details: `{e}`"
         )
 
+def start_notion_writer():
+    global notion_queue, notion_writer_task
+    notion_queue = asyncio.Queue()
+    notion_writer_task = asyncio.create_task(notion_writer())
+
+async def notion_writer():
+    while True:
+        # Wait for one page, then take whatever else is already queued (up to the batch size)
+        batch = [await notion_queue.get()]
+        while len(batch) < NOTION_BATCH_SIZE and not notion_queue.empty():
+            batch.append(notion_queue.get_nowait())
+        
+        results = await asyncio.gather(
+            *(notion.pages.create(parent={"database_id": NOTION_DATABASE_ID}, properties=properties)
+              for properties, _ in batch),
+            return_exceptions=True
+        )
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            notion_queue.task_done()
+
+async def create_notion_page(properties):
+    # Queue the page for the Notion writer and wait for the API result
+    future = asyncio.get_running_loop().create_future()
+    await notion_queue.put((properties, future))
+    return await future
+
 @tasks.loop(hours=168)  # 7 days
 async def reminder_task():
     try: